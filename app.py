@@ -2,6 +2,12 @@ import traceback
 from flask import Flask, request, jsonify, make_response
 import os
 import json
+import gc
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
 from urllib.parse import urlencode, urlunparse
 
 app = Flask(__name__, template_folder='templates')
@@ -9,6 +15,25 @@ app = Flask(__name__, template_folder='templates')
 # Base directory used if FILES_DIR env var is not set
 BASE_DIR = os.path.dirname(__file__)
 
+# Seconds clients are told to wait (Retry-After) while resources are still loading
+DEFAULT_WARMUP_RETRY_AFTER = 1
+
+# Number of (parameter, value) filter masks cached per resource type
+MASK_CACHE_SIZE = 256
+
+# _count above which a search is admitted as 'search' (expensive) rather than 'read'
+DEFAULT_EXPENSIVE_COUNT = 100
+
+
+def get_files_dir():
+    return os.environ.get('FILES_DIR', os.path.join(BASE_DIR, 'files'))
+
+
+def env_number(name, default, cast=int):
+    try:
+        return cast(os.environ.get(name, default))
+    except ValueError:
+        return default
 
 
 @app.route('/')
@@ -28,13 +53,17 @@ def index():
     return resp
 
 
-def load_json_files(folder):
-    """Yield parsed JSON objects from files in folder (sorted by filename)."""
+def load_json_files(folder, progress=None):
+    """Yield parsed JSON objects from files in folder (sorted by filename).
+    If progress is given it is called as progress(loaded, total) while files are parsed.
+    """
     if not os.path.isdir(folder):
         return []
     files = sorted(f for f in os.listdir(folder) if f.lower().endswith('.json') and not f.lower().endswith('_summary.json'))
     results = []
-    for fn in files:
+    if progress:
+        progress(0, len(files))
+    for i, fn in enumerate(files):
         path = os.path.join(folder, fn)
         try:
             with open(path, 'r', encoding='utf-8') as fh:
@@ -42,10 +71,221 @@ def load_json_files(folder):
         except Exception:
             # skip invalid files
             continue
+        finally:
+            if progress:
+                progress(i + 1, len(files))
     print(f"Loaded {len(results)} resources from {folder}")
     return results
 
 
+class ResourceTypeState:
+    """Load state and parsed resources of a single resource type folder.
+    Resources are parsed once; status goes pending -> loading -> ready (or failed).
+    """
+
+    def __init__(self, resource_type, folder):
+        self.resource_type = resource_type
+        self.folder = folder
+        self.status = 'pending'
+        self.files_total = 0
+        self.files_loaded = 0
+        self.resources = []
+        self.index = ColumnIndex([])
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def _progress(self, loaded, total):
+        self.files_loaded = loaded
+        self.files_total = total
+
+    def load(self):
+        """Parse the folder if nobody has yet; concurrent callers wait for the first load.
+        A failed load is retried once WARMUP_RETRY_AFTER seconds have passed.
+        """
+        with self._lock:
+            if self.ready.is_set():
+                return
+            if self.status == 'failed' and time.time() - self.finished_at < warmup_retry_after():
+                return
+            self.status = 'loading'
+            self.started_at = time.time()
+            try:
+                resources = load_json_files(self.folder, progress=self._progress)
+                self.index = ColumnIndex(resources)
+                self.resources = resources
+                self.error = None
+                self.status = 'ready'
+            except Exception as exc:
+                print(f"Failed to load resources from {self.folder}")
+                traceback.print_exc()
+                self.error = str(exc)
+                self.status = 'failed'
+            self.finished_at = time.time()
+            if self.status == 'ready':
+                self.ready.set()
+
+    def progress(self):
+        info = {
+            'status': self.status,
+            'filesLoaded': self.files_loaded,
+            'filesTotal': self.files_total,
+            'resources': len(self.resources),
+        }
+        if self.started_at is not None:
+            info['elapsedSeconds'] = round((self.finished_at or time.time()) - self.started_at, 3)
+        if self.error:
+            info['error'] = self.error
+        return info
+
+
+class ResourceStore:
+    """Process-wide cache of the resource type folders under FILES_DIR."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types = {}
+        self._warmups = {}
+
+    def get(self, files_dir, resource_type):
+        """Return the state for resource_type, or None if there is no such folder."""
+        key = (files_dir, resource_type)
+        with self._lock:
+            state = self._types.get(key)
+            if state is None:
+                folder = os.path.join(files_dir, resource_type)
+                if not os.path.isdir(folder):
+                    return None
+                state = self._types[key] = ResourceTypeState(resource_type, folder)
+            return state
+
+    def discover(self, files_dir):
+        """Register every resource type folder under files_dir and return their states."""
+        if not os.path.isdir(files_dir):
+            return []
+        names = sorted(d for d in os.listdir(files_dir) if os.path.isdir(os.path.join(files_dir, d)))
+        return [s for s in (self.get(files_dir, name) for name in names) if s is not None]
+
+    def load_in_background(self, state):
+        if state.status in ('pending', 'failed'):
+            threading.Thread(target=state.load, name=f'fhir-load-{state.resource_type}', daemon=True).start()
+
+    def start_warmup(self, files_dir):
+        """Load every resource type under files_dir in a background thread (once per directory).
+        Returns the event set when that warm-up has finished, whoever started it.
+        """
+        with self._lock:
+            done = self._warmups.get(files_dir)
+            if done is not None:
+                return done
+            done = self._warmups[files_dir] = threading.Event()
+        states = self.discover(files_dir)
+
+        def warm_up():
+            for state in states:
+                state.load()
+            done.set()
+            print(f"Warm-up finished for {len(states)} resource types in {files_dir}")
+
+        threading.Thread(target=warm_up, name='fhir-warmup', daemon=True).start()
+        return done
+
+    def reset(self):
+        """Forget every loaded type so the next warm-up (or request) reads the folders again."""
+        with self._lock:
+            self._types = {}
+            self._warmups = {}
+
+    def status(self, files_dir):
+        """Return (ready, per-type progress) for files_dir."""
+        with self._lock:
+            done = self._warmups.get(files_dir)
+            states = [s for (d, _), s in sorted(self._types.items()) if d == files_dir]
+        types = {s.resource_type: s.progress() for s in states}
+        ready = done is not None and done.is_set() and all(s.status == 'ready' for s in states)
+        return ready, types
+
+    def retry_failed(self, files_dir):
+        """Reload, in the background, every type under files_dir whose load failed."""
+        with self._lock:
+            states = [s for (d, _), s in self._types.items() if d == files_dir]
+        for state in states:
+            if state.status == 'failed':
+                self.load_in_background(state)
+
+
+store = ResourceStore()
+
+
+def start_warmup(files_dir=None):
+    """Start loading and indexing every folder under FILES_DIR without blocking the caller.
+    Returns a threading.Event set once the warm-up has finished.
+    """
+    return store.start_warmup(files_dir or get_files_dir())
+
+
+def preload_store(files_dir=None):
+    """Load every resource type synchronously, for a pre-fork server master.
+    Loaded objects are moved out of the garbage collector's reach (gc.freeze) so
+    forked workers keep sharing their memory pages copy-on-write.
+    """
+    # waits for a warm-up already started by a request just as for a new one
+    start_warmup(files_dir).wait()
+    gc.freeze()
+
+
+def reload_store(files_dir=None):
+    """Drop the loaded resources and load FILES_DIR again (see preload_store)."""
+    gc.unfreeze()
+    store.reset()
+    preload_store(files_dir)
+
+
+def warmup_retry_after():
+    return max(1, env_number('WARMUP_RETRY_AFTER', DEFAULT_WARMUP_RETRY_AFTER))
+
+
+def unavailable_type_response(state):
+    """503 with Retry-After for a resource type that is still loading or failed to load."""
+    if state.status == 'failed':
+        error = f'{state.resource_type} resources failed to load'
+    else:
+        error = f'{state.resource_type} resources are still loading'
+    resp = jsonify({'error': error, 'progress': state.progress()})
+    resp.status_code = 503
+    resp.headers['Retry-After'] = str(warmup_retry_after())
+    return resp
+
+
+@app.before_request
+def ensure_warmup():
+    # Start the background warm-up however the server was launched (no-op once started)
+    start_warmup()
+
+
+@app.route('/healthz')
+def healthz():
+    # Liveness: the process is serving requests, whatever the load progress
+    _, types = store.status(get_files_dir())
+    return jsonify({'status': 'ok', 'types': types})
+
+
+@app.route('/readyz')
+def readyz():
+    # Readiness: every resource type folder has been loaded
+    files_dir = get_files_dir()
+    store.retry_failed(files_dir)
+    ready, types = store.status(files_dir)
+    if ready:
+        return jsonify({'status': 'ready', 'types': types})
+    resp = jsonify({'status': 'loading', 'types': types})
+    resp.status_code = 503
+    resp.headers['Retry-After'] = str(warmup_retry_after())
+    return resp
+
+
 def matches_search_params(resource, search_params):
     """Check if a resource matches all provided search parameters.
     Supports searching on _id and nested fields like name, gender, birthdate, etc.
@@ -115,6 +355,278 @@ def matches_search_params(resource, search_params):
     return True
 
 
+def rows_to_mask(rows, size):
+    """Turn an iterable of row numbers into a bitmap (int, bit i set for row i)."""
+    bits = bytearray((size + 7) // 8)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(bits, 'little')
+
+
+# bytes.translate tables: bit b of a byte -> ASCII '0'/'1', and a 0/1 flag byte -> '0'/'1'
+BIT_DIGITS = [
+    bytes.maketrans(bytes(range(256)), bytes(0x31 if x >> b & 1 else 0x30 for x in range(256)))
+    for b in range(8)
+]
+FLAG_DIGITS = BIT_DIGITS[0]
+
+
+def digits_to_mask(digits):
+    """Turn one ASCII '0'/'1' per row (row 0 first) into a bitmap without a Python loop."""
+    return int(digits[::-1], 2) if digits else 0
+
+
+class CodedColumn:
+    """Dictionary-encoded column: each row holds the code of its value in the sorted
+    distinct values, stored as bit slices (slice j = rows whose code has bit j set).
+    A range of codes becomes a bitmap with a few big-int operations per slice.
+    Rows whose value is None get a code past the last value and never match.
+    """
+
+    # Above this many code ranges a set of codes is matched row by row (in C, via map)
+    MAX_RANGES = 16
+
+    def __init__(self, row_values, all_rows):
+        self.values = sorted({v for v in row_values if v is not None})
+        lookup = {v: code for code, v in enumerate(self.values)}
+        missing = len(self.values)
+        self.codes = array('I', [missing if v is None else lookup[v] for v in row_values])
+        self.all_rows = all_rows
+        raw = array('I', self.codes)
+        if sys.byteorder == 'big':
+            raw.byteswap()
+        raw = raw.tobytes()
+        width = self.codes.itemsize
+        self.slices = [
+            digits_to_mask(raw[j >> 3::width].translate(BIT_DIGITS[j & 7]))
+            for j in range(max(1, missing.bit_length()))
+        ]
+
+    def less_than(self, code):
+        """Bitmap of the rows whose code is below `code` (bit-sliced comparison)."""
+        if code <= 0:
+            return 0
+        if code >> len(self.slices):
+            return self.all_rows
+        lt = 0
+        eq = self.all_rows
+        for j in range(len(self.slices) - 1, -1, -1):
+            if code >> j & 1:
+                lt |= eq & ~self.slices[j]
+                eq &= self.slices[j]
+            else:
+                eq &= ~self.slices[j]
+        return lt
+
+    def range_mask(self, lo, hi):
+        """Bitmap of the rows whose code is in [lo, hi)."""
+        if lo >= hi:
+            return 0
+        return self.less_than(hi) ^ self.less_than(lo)
+
+    @staticmethod
+    def code_ranges(codes):
+        """Group the sorted list `codes` into [lo, hi) runs of consecutive codes."""
+        ranges = []
+        for code in codes:
+            if ranges and ranges[-1][1] == code:
+                ranges[-1][1] = code + 1
+            else:
+                ranges.append([code, code + 1])
+        return ranges
+
+    def codes_mask(self, codes):
+        """Bitmap of the rows whose code is in the sorted list `codes`."""
+        ranges = self.code_ranges(codes)
+        if len(ranges) <= self.MAX_RANGES:
+            result = 0
+            for lo, hi in ranges:
+                result |= self.range_mask(lo, hi)
+            return result
+        wanted = set(codes)
+        return digits_to_mask(bytes(map(wanted.__contains__, self.codes)).translate(FLAG_DIGITS))
+
+
+class ColumnIndex:
+    """Columnar index of the searchable fields of one resource type.
+
+    Every indexed predicate (_id, identifier, gender, birthdate, name) becomes a
+    bitmap over the rows; AND logic is the intersection of the bitmaps and the
+    match count is a popcount. Any other parameter is checked with
+    matches_search_params on the rows that are left.
+    """
+
+    # Indexed parameters in evaluation order: most selective and cheapest first
+    INDEXED_PARAMS = ('_id', 'identifier', 'gender', 'birthdate', 'name')
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.size = len(resources)
+        self.all_rows = (1 << self.size) - 1
+        ids = {}
+        identifiers = {}
+        genders = {}
+        birthdates = []
+        names_by_row = []
+        for row, resource in enumerate(resources):
+            ids.setdefault(str(resource.get('id', '')).lower(), []).append(row)
+            genders.setdefault(str(resource.get('gender', '')).lower(), []).append(row)
+            birthdates.append(str(resource.get('birthDate', '')))
+            idents = resource.get('identifier', [])
+            if not isinstance(idents, list):
+                idents = [idents]
+            for ident in idents:
+                if isinstance(ident, dict):
+                    identifiers.setdefault(str(ident.get('value', '')).lower(), []).append(row)
+            names = resource.get('name', [])
+            if not isinstance(names, list):
+                names = [names]
+            entries = []
+            for name_obj in names:
+                if isinstance(name_obj, dict):
+                    given = name_obj.get('given', [])
+                    if not isinstance(given, list):
+                        given = [given]
+                    entries.append(' '.join(str(g) for g in given) + ' ' + str(name_obj.get('family', '')))
+                elif isinstance(name_obj, str):
+                    entries.append(name_obj)
+            # a row's names as one NUL-separated string; None when it has none
+            names_by_row.append('\0'.join(entries).lower() if entries else None)
+        # exact-match columns: lowercased value -> row numbers; bitmaps of the frequent
+        # values (at most 64 per column) are built up front, the rest on demand
+        self.columns = {'_id': ids, 'identifier': identifiers, 'gender': genders}
+        self._dense = {}
+        for param, column in self.columns.items():
+            for value, rows in column.items():
+                if len(rows) > self.size >> 6:
+                    self._dense[(param, value)] = rows_to_mask(rows, self.size)
+        # birthDate: sorted distinct values, so a prefix is a contiguous code range
+        self.birthdate = CodedColumn(birthdates, self.all_rows)
+        # name: distinct row texts joined by newlines and searched with str.find
+        self.name = CodedColumn(names_by_row, self.all_rows)
+        self.name_text = '\n'.join(self.name.values)
+        self.name_starts = []
+        pos = 0
+        for text in self.name.values:
+            self.name_starts.append(pos)
+            pos += len(text) + 1
+        self._masks = {}
+        self._masks_lock = threading.Lock()
+
+    def _name_codes(self, value):
+        """Sorted codes of the distinct row name texts containing value."""
+        text = self.name_text
+        starts = self.name_starts
+        codes = []
+        pos = text.find(value) if starts else -1
+        while pos != -1:
+            code = bisect_right(starts, pos) - 1
+            codes.append(code)
+            if code + 1 >= len(starts):
+                break
+            pos = text.find(value, starts[code + 1])
+        return codes
+
+    def mask(self, param, value):
+        """Bitmap of the rows matching one indexed predicate.
+        Exact-match masks are cheap to rebuild; birthdate and name masks are cached.
+        """
+        if param not in ('birthdate', 'name'):
+            dense = self._dense.get((param, value.lower()))
+            if dense is not None:
+                return dense
+            return rows_to_mask(self.columns[param].get(value.lower(), ()), self.size)
+        key = (param, value)
+        with self._masks_lock:
+            cached = self._masks.get(key)
+        if cached is not None:
+            return cached
+        if param == 'birthdate':
+            values = self.birthdate.values
+            lo = bisect_left(values, value)
+            hi = bisect_right(values, value + '\U0010ffff') if value else len(values)
+            result = self.birthdate.range_mask(lo, hi)
+        else:
+            result = self.name.codes_mask(self._name_codes(value.lower()))
+        with self._masks_lock:
+            if key not in self._masks and len(self._masks) >= MASK_CACHE_SIZE:
+                self._masks.pop(next(iter(self._masks)))
+            self._masks[key] = result
+        return result
+
+    def filter(self, search_params):
+        """Return the bitmap of rows matching all search_params (AND logic)."""
+        result = self.all_rows
+        indexed = []
+        others = {}
+        for param, value in (search_params or {}).items():
+            if param in self.INDEXED_PARAMS and not (param == 'name' and ('\0' in value or '\n' in value)):
+                indexed.append((self.INDEXED_PARAMS.index(param), param, value))
+            else:
+                others[param] = value
+        for _, param, value in sorted(indexed):
+            name_codes = None
+            if param == 'name' and (param, value) not in self._masks and self.count(result) <= self.size >> 6:
+                name_codes = self._name_codes(value.lower())
+                if len(CodedColumn.code_ranges(name_codes)) <= CodedColumn.MAX_RANGES:
+                    name_codes = None
+            if name_codes is not None:
+                # scattered name matches and few candidates left: check the candidates' codes
+                wanted = set(name_codes)
+                codes = self.name.codes
+                result = rows_to_mask((row for row in self.iter_rows(result) if codes[row] in wanted), self.size)
+            else:
+                result &= self.mask(param, value)
+            if not result:
+                return 0
+        if others:
+            result = rows_to_mask(
+                (row for row in self.iter_rows(result) if matches_search_params(self.resources[row], others)),
+                self.size,
+            )
+        return result
+
+    @staticmethod
+    def count(mask):
+        return mask.bit_count()
+
+    def iter_rows(self, mask, skip=0):
+        """Yield the row numbers set in mask in ascending order, skipping the first `skip`."""
+        if not mask:
+            return
+        words = array('Q')
+        words.frombytes(mask.to_bytes(((self.size + 63) // 64) * 8, 'little'))
+        if sys.byteorder == 'big':
+            words.byteswap()
+        for i, word in enumerate(words):
+            if not word:
+                continue
+            if skip:
+                n = self.count(word)
+                if skip >= n:
+                    skip -= n
+                    continue
+            base = i * 64
+            while word:
+                low = word & -word
+                word ^= low
+                if skip:
+                    skip -= 1
+                    continue
+                yield base + low.bit_length() - 1
+
+    def select(self, mask, offset=0, limit=None):
+        """Return the resources of mask in file order, paged by offset/limit."""
+        results = []
+        if limit is not None and limit <= 0:
+            return results
+        for row in self.iter_rows(mask, skip=max(0, offset)):
+            results.append(self.resources[row])
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+
 def make_bundle(total, entries=None, base_url=None):
     """Construct a FHIR Bundle dict. entries is a list of resource dicts.
     If entries is empty or None, don't include link/search related fields.
@@ -136,10 +648,152 @@ def render_bundle_response(bundle):
     return resp
 
 
+class AdmissionController:
+    """Concurrency limiter for one class of requests with a bounded wait queue.
+    A limit <= 0 disables limiting for the class.
+    """
+
+    def __init__(self, name, limit, queue_size, queue_timeout):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {'queue_full': 0, 'timeout': 0}
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed.
+        Returns None when admitted, otherwise the rejection reason.
+        """
+        with self._cond:
+            if self.limit <= 0 or self.active < self.limit:
+                self.active += 1
+                self.admitted += 1
+                return None
+            if self.waiting >= self.queue_size:
+                self.rejected['queue_full'] += 1
+                return 'queue_full'
+            self.waiting += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected['timeout'] += 1
+                        return 'timeout'
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            return None
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+def make_admission_controllers():
+    """Build the 'read' and 'search' controllers from ADMISSION_* environment variables."""
+    timeout = env_number('ADMISSION_QUEUE_TIMEOUT', 5.0, float)
+    return {
+        'read': AdmissionController(
+            'read',
+            env_number('ADMISSION_READ_LIMIT', 32),
+            env_number('ADMISSION_READ_QUEUE', 64),
+            timeout,
+        ),
+        'search': AdmissionController(
+            'search',
+            env_number('ADMISSION_SEARCH_LIMIT', 4),
+            env_number('ADMISSION_SEARCH_QUEUE', 8),
+            timeout,
+        ),
+    }
+
+
+admission = make_admission_controllers()
+
+
+def classify_request(resource_id=None, extra=None):
+    """Return 'search' for expensive requests ($summary, large _count), otherwise 'read'."""
+    if resource_id == '$summary' or extra == '$summary':
+        return 'search'
+    try:
+        count_i = int(request.args.get('_count', '0'))
+    except ValueError:
+        # rejected with a 400 by fhir_endpoint_impl, cheap either way
+        return 'read'
+    if count_i > env_number('ADMISSION_EXPENSIVE_COUNT', DEFAULT_EXPENSIVE_COUNT):
+        return 'search'
+    return 'read'
+
+
+def fhir_endpoint(resource_type, resource_id=None, extra=None):
+    """Admission-controlled entry point for fhir_endpoint_impl.
+    Excess load is refused fast: 429 when the wait queue is full, 503 when the wait timed out.
+    """
+    controller = admission[classify_request(resource_id, extra)]
+    reason = controller.acquire()
+    if reason is not None:
+        resp = jsonify({'error': f'Server is overloaded ({controller.name} {reason.replace("_", " ")}), retry later'})
+        resp.status_code = 429 if reason == 'queue_full' else 503
+        resp.headers['Retry-After'] = str(env_number('ADMISSION_RETRY_AFTER', 1))
+        return resp
+    try:
+        return fhir_endpoint_impl(resource_type, resource_id, extra)
+    finally:
+        controller.release()
+
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text exposition of the admission controllers
+    lines = [
+        '# HELP fhir_admission_active Requests currently being processed.',
+        '# TYPE fhir_admission_active gauge',
+    ]
+    lines += [f'fhir_admission_active{{class="{n}"}} {c.active}' for n, c in admission.items()]
+    lines += [
+        '# HELP fhir_admission_queue_depth Requests waiting for a processing slot.',
+        '# TYPE fhir_admission_queue_depth gauge',
+    ]
+    lines += [f'fhir_admission_queue_depth{{class="{n}"}} {c.waiting}' for n, c in admission.items()]
+    lines += [
+        '# HELP fhir_admission_limit Maximum concurrent requests (0 = unlimited).',
+        '# TYPE fhir_admission_limit gauge',
+    ]
+    lines += [f'fhir_admission_limit{{class="{n}"}} {max(0, c.limit)}' for n, c in admission.items()]
+    lines += [
+        '# HELP fhir_admission_queue_limit Maximum queued requests.',
+        '# TYPE fhir_admission_queue_limit gauge',
+    ]
+    lines += [f'fhir_admission_queue_limit{{class="{n}"}} {c.queue_size}' for n, c in admission.items()]
+    lines += [
+        '# HELP fhir_admission_admitted_total Requests admitted for processing.',
+        '# TYPE fhir_admission_admitted_total counter',
+    ]
+    lines += [f'fhir_admission_admitted_total{{class="{n}"}} {c.admitted}' for n, c in admission.items()]
+    lines += [
+        '# HELP fhir_admission_rejected_total Requests rejected by admission control.',
+        '# TYPE fhir_admission_rejected_total counter',
+    ]
+    for n, c in admission.items():
+        for reason, value in c.rejected.items():
+            lines.append(f'fhir_admission_rejected_total{{class="{n}",reason="{reason}"}} {value}')
+    resp = make_response('\n'.join(lines) + '\n')
+    resp.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return resp
+
+
 def create_fhir_endpoint(resource_type):
     """Factory function to create FHIR endpoint handlers for different resource types."""
     def handler(resource_id=None, extra=None):
-        return fhir_endpoint_impl(resource_type, resource_id, extra)
+        return fhir_endpoint(resource_type, resource_id, extra)
     handler.__name__ = f'fhir_{resource_type.lower()}_endpoint'
     return handler
 
@@ -147,7 +801,7 @@ def create_fhir_endpoint(resource_type):
 
 def fhir_endpoint_impl(resource_type, resource_id=None, extra=None):
     # resource_type is either 'Bundle' or 'Patient'
-    files_dir = os.environ.get('FILES_DIR', os.path.join(BASE_DIR, 'files'))
+    files_dir = get_files_dir()
     resource_folder = os.path.join(files_dir, resource_type)
     
     # Track if this is a $summary operation (always return bundle, never single resource)
@@ -213,8 +867,19 @@ def fhir_endpoint_impl(resource_type, resource_id=None, extra=None):
         except ValueError:
             return jsonify({'error': '_offset must be an integer'}), 400
 
-    # Load all resources from the appropriate folder
-    all_resources = load_json_files(resource_folder)
+    # Resources are loaded once per type; early requests block or get 503 per WARMUP_POLICY
+    state = store.get(files_dir, resource_type)
+    if state is None:
+        index = ColumnIndex([])
+    else:
+        if not state.ready.is_set():
+            if os.environ.get('WARMUP_POLICY', 'block').lower() == 'reject':
+                store.load_in_background(state)
+                return unavailable_type_response(state)
+            state.load()
+            if not state.ready.is_set():
+                return unavailable_type_response(state)
+        index = state.index
     
     # Extract search parameters (exclude pagination params)
     search_params = {}
@@ -231,15 +896,14 @@ def fhir_endpoint_impl(resource_type, resource_id=None, extra=None):
     if resource_id is not None and not resource_id.startswith('$'):
         search_params['_id'] = resource_id
     
-    # Filter resources by search parameters
-    resources = [r for r in all_resources if matches_search_params(r, search_params)]
-    total = len(resources)
+    # Filter resources by search parameters: bitmap of matching rows, total is its popcount
+    matches = index.filter(search_params)
+    total = index.count(matches)
 
     print(f"Found {total} matching resources for type {resource_type} with search params {search_params}")
-    print(f"listing resource IDs: {[r.get('id') for r in resources]}")
     # handle summary operation: return the json file that is named <resource_id>_summary.json
     if is_summary_operation and total == 1:
-        resource_id = resources[0].get('id')
+        resource_id = index.select(matches, limit=1)[0].get('id')
         summary_filename = f"{resource_id}_summary.json"
         summary_path = os.path.join(resource_folder, summary_filename)
         if os.path.isfile(summary_path):
@@ -258,7 +922,7 @@ def fhir_endpoint_impl(resource_type, resource_id=None, extra=None):
     # Return single resource directly only if: ID lookup AND no explicit paging params AND not a special operation
     if total == 1 and resource_id is not None and not (has_count or has_page or has_offset) and not resource_id.startswith('$') and not is_summary_operation:
         # Return the single matching resource directly (only for simple ID lookups without paging or special operations)
-        return resources[0]
+        return index.select(matches, limit=1)[0]
 
     if count_i == 0:
         # Return bundle with total set and no entries/links
@@ -269,7 +933,8 @@ def fhir_endpoint_impl(resource_type, resource_id=None, extra=None):
     # count_i > 0: get slice [offset_i: offset_i+count_i]
     start = max(0, offset_i)
     end = start + max(0, count_i)
-    page_entries = resources[start:end]
+    page_entries = index.select(matches, offset=start, limit=end - start)
+    print(f"listing resource IDs: {[r.get('id') for r in page_entries]}")
     bundle = make_bundle(total, entries=page_entries)
 
     # Build paging links (self/next/prev/last) when appropriate
@@ -317,7 +982,7 @@ def fhir_endpoint_impl(resource_type, resource_id=None, extra=None):
 app.add_url_rule(
     '/fhir/<resource_type>',
     endpoint='fhir_base',
-    view_func=fhir_endpoint_impl,
+    view_func=fhir_endpoint,
     defaults={'resource_id': None, 'extra': None},
     strict_slashes=False,
     methods=['GET', 'POST']
@@ -325,7 +990,7 @@ app.add_url_rule(
 app.add_url_rule(
     '/fhir/<resource_type>/<resource_id>',
     endpoint='fhir_id',
-    view_func=fhir_endpoint_impl,
+    view_func=fhir_endpoint,
     defaults={'extra': None},
     strict_slashes=False,
     methods=['GET', 'POST']
@@ -333,11 +998,14 @@ app.add_url_rule(
 app.add_url_rule(
     '/fhir/<resource_type>/<resource_id>/<extra>',
     endpoint='fhir_id_extra',
-    view_func=fhir_endpoint_impl,
+    view_func=fhir_endpoint,
     strict_slashes=False,
     methods=['GET', 'POST']
 )
 
 
 if __name__ == '__main__':
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warmup()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,132 @@
+"""Throughput benchmark for the production (gunicorn) serving mode.
+
+Generates a synthetic FILES_DIR, starts `gunicorn -c gunicorn.conf.py app:app`
+with an increasing number of workers and measures requests per second from
+several client processes. Throughput should grow with the worker count up to
+the number of available cores.
+
+Usage:
+    python benchmarks/bench_throughput.py [--patients 2000] [--duration 5] [--workers 1,2,4]
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Mix of cheap reads and filtered searches
+REQUEST_PATHS = [
+    '/fhir/Patient/patient-{i}',
+    '/fhir/Patient?gender=female&_count=10',
+    '/fhir/Patient?birthdate=1980&_count=10',
+    '/fhir/Patient?name=an&_count=0',
+]
+
+
+def generate_files(files_dir, patients):
+    folder = os.path.join(files_dir, 'Patient')
+    os.makedirs(folder)
+    given = ['Anna', 'John', 'Jane', 'Ivan', 'Maria', 'Daniel']
+    family = ['Smith', 'Garcia', 'Novak', 'Rossi']
+    for i in range(patients):
+        resource = {
+            'resourceType': 'Patient',
+            'id': f'patient-{i}',
+            'identifier': [{'value': f'patient-{i}'}],
+            'name': [{'given': [given[i % len(given)]], 'family': family[i % len(family)]}],
+            'gender': 'female' if i % 2 else 'male',
+            'birthDate': f'{1950 + i % 50}-{1 + i % 12:02d}-{1 + i % 28:02d}',
+        }
+        with open(os.path.join(folder, f'patient{i}.json'), 'w', encoding='utf-8') as fh:
+            json.dump(resource, fh)
+
+
+def client_loop(args):
+    port, duration, patients, seed = args
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    done = 0
+    i = seed
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        path = REQUEST_PATHS[i % len(REQUEST_PATHS)].format(i=i % patients)
+        conn.request('GET', path)
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status == 200:
+            done += 1
+        i += 1
+    conn.close()
+    return done
+
+
+def wait_ready(port, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/readyz')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('server did not become ready')
+
+
+def run(workers, files_dir, port, clients, duration, patients):
+    env = dict(
+        os.environ,
+        FILES_DIR=files_dir,
+        WEB_CONCURRENCY=str(workers),
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        # measure raw throughput, not admission control
+        ADMISSION_READ_LIMIT='0',
+        ADMISSION_SEARCH_LIMIT='0',
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(port)
+        with multiprocessing.Pool(clients) as pool:
+            counts = pool.map(client_loop, [(port, duration, patients, c * 7919) for c in range(clients)])
+        return sum(counts) / duration
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    cores = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, cores} & set(range(1, cores + 1))) or [1]
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--clients', type=int, default=max(4, 2 * cores))
+    parser.add_argument('--workers', default=','.join(map(str, default_workers)))
+    parser.add_argument('--port', type=int, default=5077)
+    args = parser.parse_args()
+
+    files_dir = tempfile.mkdtemp(prefix='fhir-bench-')
+    try:
+        generate_files(files_dir, args.patients)
+        print(f"{cores} cores, {args.patients} patients, {args.clients} clients, {args.duration}s per run")
+        baseline = None
+        for workers in [int(w) for w in args.workers.split(',')]:
+            rps = run(workers, files_dir, args.port, args.clients, args.duration, args.patients)
+            baseline = baseline or rps
+            print(f"workers={workers:<3} {rps:10.1f} req/s  x{rps / baseline:.2f}")
+    finally:
+        shutil.rmtree(files_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# Production server configuration: gunicorn -c gunicorn.conf.py app:app
+#
+# The master imports the app and loads every resource type under FILES_DIR
+# before forking, so all workers share the parsed store copy-on-write.
+# `kill -HUP <master pid>` reloads the store in the master and replaces every
+# worker with a fresh fork of the reloaded data.
+import math
+import os
+
+# Per-worker admission control defaults (see app.make_admission_controllers),
+# smaller than the single-process ones since every worker has its own limiter
+ADMISSION_DEFAULTS = {
+    'ADMISSION_READ_LIMIT': '8',
+    'ADMISSION_READ_QUEUE': '16',
+    'ADMISSION_SEARCH_LIMIT': '2',
+    'ADMISSION_SEARCH_QUEUE': '4',
+}
+# Threads beyond the admission slots and queues, free to answer 429s and probes
+SPARE_THREADS = 4
+
+
+def available_cpus():
+    """CPUs this process may use: the affinity mask, capped by a cgroup CPU quota."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    quota = period = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as fh:
+            quota, period = fh.read().split()[:2]
+    except (OSError, ValueError):
+        try:
+            # cgroup v1: quota is -1 when unlimited
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as fh:
+                quota = fh.read().strip()
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as fh:
+                period = fh.read().strip()
+        except OSError:
+            pass
+    try:
+        if quota not in (None, 'max', '-1'):
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (ValueError, ZeroDivisionError):
+        pass
+    return cpus
+
+
+def admission_limit(name):
+    """Read an ADMISSION_* variable like app.env_number does: a value that is not an
+    integer means the default. The value used is written back to the environment
+    so the app's limiters and the thread count below agree.
+    """
+    try:
+        value = int(os.environ.get(name, ADMISSION_DEFAULTS[name]))
+    except ValueError:
+        value = int(ADMISSION_DEFAULTS[name])
+    os.environ[name] = str(value)
+    return value
+
+
+def admission_threads():
+    """Threads needed so requests beyond the admission limits and queues reach the limiter
+    (and get a fast 429) instead of waiting unseen in the worker's connection queue.
+    Returns None when a class is unlimited (limit <= 0).
+    """
+    read_limit, read_queue, search_limit, search_queue = (admission_limit(name) for name in ADMISSION_DEFAULTS)
+    if read_limit <= 0 or search_limit <= 0:
+        return None
+    return read_limit + read_queue + search_limit + search_queue + SPARE_THREADS
+
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', available_cpus()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', admission_threads() or 8))
+# Open connections per worker (keep-alive included); beyond this the worker stops accepting
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2 * threads))
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+accesslog = os.environ.get('GUNICORN_ACCESSLOG')
+
+
+def on_starting(server):
+    import app
+    server.log.info("Loading resources from %s before forking workers", app.get_files_dir())
+    app.preload_store()
+
+
+def on_reload(server):
+    import app
+    server.log.info("Reloading resources from %s", app.get_files_dir())
+    app.reload_store()
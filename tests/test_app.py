@@ -1,11 +1,21 @@
+import gc
+import json
 import os
+import random
+import shutil
+import threading
+import time
 import pytest
 
 # Ensure the app uses the test resources directory for files
 TEST_RESOURCES = os.path.join(os.path.dirname(__file__), 'resources')
 os.environ['FILES_DIR'] = TEST_RESOURCES
 
-from app import app
+import app as app_module
+from app import (
+    AdmissionController, ColumnIndex, app, classify_request, load_json_files,
+    matches_search_params, preload_store, reload_store, start_warmup, store,
+)
 
 
 @pytest.fixture
@@ -15,6 +25,20 @@ def client():
         yield client
 
 
+@pytest.fixture
+def files_dir(tmp_path, monkeypatch):
+    """Return a function pointing FILES_DIR at a tmp copy of the test Patient resources.
+    With warmup=False the background warm-up is not started by requests.
+    """
+    def make(warmup=True):
+        shutil.copytree(os.path.join(TEST_RESOURCES, 'Patient'), tmp_path / 'Patient')
+        monkeypatch.setenv('FILES_DIR', str(tmp_path))
+        if not warmup:
+            monkeypatch.setattr(store, 'start_warmup', lambda files_dir: None)
+        return tmp_path
+    return make
+
+
 def test_index(client):
     resp = client.get('/')
     assert resp.status_code == 200
@@ -392,3 +416,314 @@ def test_fhir_patient_search_multiple_params_and_logic(client):
     data4 = resp4.get_json()
     assert data4['total'] == 1
     assert data4['entry'][0]['resource']['id'] == 'patient-1'
+
+
+def test_healthz_always_ok(client):
+    resp = client.get('/healthz')
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['status'] == 'ok'
+    assert 'types' in data
+
+
+def test_readyz_after_warmup(client):
+    assert start_warmup().wait(timeout=10)
+    resp = client.get('/readyz')
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['status'] == 'ready'
+    # every folder under FILES_DIR is loaded and reports its progress
+    assert data['types']['Patient']['status'] == 'ready'
+    assert data['types']['Patient']['resources'] == 3
+    assert data['types']['Bundle']['resources'] == 3
+    assert data['types']['Bundle']['filesLoaded'] == data['types']['Bundle']['filesTotal']
+
+
+def test_readyz_before_warmup(client, files_dir):
+    files_dir(warmup=False)
+    resp = client.get('/readyz')
+    assert resp.status_code == 503
+    assert 'Retry-After' in resp.headers
+    assert resp.get_json()['status'] == 'loading'
+
+
+def test_readyz_starts_warmup_without_entry_point(client, files_dir):
+    files_dir()
+    # no start_warmup() call: the first request starts it, whatever the server
+    deadline = time.time() + 10
+    resp = client.get('/readyz')
+    while resp.status_code != 200 and time.time() < deadline:
+        time.sleep(0.05)
+        resp = client.get('/readyz')
+    assert resp.status_code == 200
+    assert resp.get_json()['types']['Patient']['resources'] == 3
+
+
+def test_failed_type_returns_503_and_is_retried(client, files_dir, monkeypatch):
+    tmp_dir = files_dir(warmup=False)
+    failing = [True]
+    real_load = app_module.load_json_files
+
+    def flaky_load(folder, progress=None):
+        if failing[0]:
+            raise OSError('disk error')
+        return real_load(folder, progress=progress)
+
+    monkeypatch.setattr(app_module, 'load_json_files', flaky_load)
+    resp = client.get('/fhir/Patient?_count=10')
+    assert resp.status_code == 503
+    assert 'Retry-After' in resp.headers
+    assert resp.get_json()['progress']['status'] == 'failed'
+
+    # once the retry delay has passed the next request loads the type again
+    failing[0] = False
+    state = store.get(str(tmp_dir), 'Patient')
+    state.finished_at -= 60
+    resp2 = client.get('/fhir/Patient?_count=10')
+    assert resp2.status_code == 200
+    assert resp2.get_json()['total'] == 3
+    assert state.progress()['status'] == 'ready'
+
+
+def test_warmup_policy_reject_returns_503(client, files_dir, monkeypatch):
+    tmp_dir = files_dir(warmup=False)
+    monkeypatch.setenv('WARMUP_POLICY', 'reject')
+    monkeypatch.setenv('WARMUP_RETRY_AFTER', '5')
+    resp = client.get('/fhir/Patient?_count=10')
+    assert resp.status_code == 503
+    assert resp.headers['Retry-After'] == '5'
+    assert 'progress' in resp.get_json()
+
+    # the rejected request kicked off the load; once ready the type is served
+    store.get(str(tmp_dir), 'Patient').ready.wait(timeout=10)
+    resp2 = client.get('/fhir/Patient?_count=10')
+    assert resp2.status_code == 200
+    assert resp2.get_json()['total'] == 3
+
+
+def test_warmup_policy_block_waits_for_load(client, files_dir, monkeypatch):
+    files_dir()
+    monkeypatch.setenv('WARMUP_POLICY', 'block')
+    resp = client.get('/fhir/Patient?_count=10')
+    assert resp.status_code == 200
+    assert resp.get_json()['total'] == 3
+
+
+def test_admission_controller_bounded_queue():
+    controller = AdmissionController('search', limit=1, queue_size=0, queue_timeout=0.1)
+    assert controller.acquire() is None
+    # no free slot and no queue room: rejected immediately
+    assert controller.acquire() == 'queue_full'
+    controller.release()
+    assert controller.acquire() is None
+    controller.release()
+    assert controller.admitted == 2
+    assert controller.rejected['queue_full'] == 1
+
+
+def test_admission_controller_queue_timeout():
+    controller = AdmissionController('read', limit=1, queue_size=1, queue_timeout=0.05)
+    assert controller.acquire() is None
+    assert controller.acquire() == 'timeout'
+    assert controller.waiting == 0
+    controller.release()
+
+
+def test_admission_controller_queued_request_admitted_after_release():
+    controller = AdmissionController('read', limit=1, queue_size=1, queue_timeout=5)
+    assert controller.acquire() is None
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(controller.acquire()))
+    waiter.start()
+    # wait until the second request sits in the queue
+    for _ in range(500):
+        if controller.waiting == 1:
+            break
+        threading.Event().wait(0.01)
+    assert controller.waiting == 1
+    assert controller.active == 1
+    controller.release()
+    waiter.join(timeout=5)
+    assert results == [None]
+    assert controller.waiting == 0
+    assert controller.active == 1
+    assert controller.admitted == 2
+    controller.release()
+
+
+def test_admission_queue_timeout_returns_503(client, monkeypatch):
+    monkeypatch.setenv('ADMISSION_RETRY_AFTER', '7')
+    saturated = app_module.AdmissionController('search', limit=1, queue_size=1, queue_timeout=0.05)
+    monkeypatch.setitem(app_module.admission, 'search', saturated)
+    assert saturated.acquire() is None
+    try:
+        resp = client.get('/fhir/Patient/patient-1/$summary')
+        assert resp.status_code == 503
+        assert resp.headers['Retry-After'] == '7'
+        assert 'error' in resp.get_json()
+        assert saturated.rejected['timeout'] == 1
+    finally:
+        saturated.release()
+
+
+def test_admission_classification(client):
+    with app.test_request_context('/fhir/Patient/patient-1/$summary'):
+        assert classify_request('patient-1', '$summary') == 'search'
+    with app.test_request_context('/fhir/Patient?_count=1000'):
+        assert classify_request() == 'search'
+    with app.test_request_context('/fhir/Patient?_count=10'):
+        assert classify_request() == 'read'
+    with app.test_request_context('/fhir/Patient/patient-1'):
+        assert classify_request('patient-1') == 'read'
+
+
+def test_admission_rejects_when_saturated(client, monkeypatch):
+    saturated = app_module.AdmissionController('search', limit=1, queue_size=0, queue_timeout=0.1)
+    monkeypatch.setitem(app_module.admission, 'search', saturated)
+    assert saturated.acquire() is None
+    try:
+        resp = client.get('/fhir/Patient/patient-1/$summary')
+        assert resp.status_code == 429
+        assert 'Retry-After' in resp.headers
+        # cheap reads have their own limit and are still served
+        resp2 = client.get('/fhir/Patient?_count=1')
+        assert resp2.status_code == 200
+    finally:
+        saturated.release()
+    resp3 = client.get('/fhir/Patient/patient-1/$summary')
+    assert resp3.status_code == 200
+    assert saturated.active == 0
+
+
+def test_metrics_exposes_admission_state(client):
+    client.get('/fhir/Patient?_count=1')
+    resp = client.get('/metrics')
+    assert resp.status_code == 200
+    assert resp.headers['Content-Type'].startswith('text/plain')
+    body = resp.get_data(as_text=True)
+    assert 'fhir_admission_queue_depth{class="read"}' in body
+    assert 'fhir_admission_rejected_total{class="search",reason="queue_full"}' in body
+    assert 'fhir_admission_admitted_total{class="read"}' in body
+
+
+def test_column_index_matches_row_by_row_filtering():
+    patients = load_json_files(os.path.join(TEST_RESOURCES, 'Patient'))
+    index = ColumnIndex(patients)
+    queries = [
+        {},
+        {'gender': 'FEMALE'},
+        {'gender': 'female', 'name': 'an'},
+        {'birthdate': '1980'},
+        {'birthdate': '19', 'gender': 'female'},
+        {'name': 'john smith'},
+        {'identifier': 'patient-1', 'gender': 'male'},
+        {'_id': 'PATIENT-2'},
+        {'gender': 'female', 'resourceType': 'patient'},
+        {'_format': 'json', 'name': 'jane'},
+        {'name': 'nobody'},
+    ]
+    for query in queries:
+        expected = [p for p in patients if matches_search_params(p, query)]
+        mask = index.filter(query)
+        assert index.count(mask) == len(expected), query
+        assert index.select(mask) == expected, query
+
+
+def test_column_index_select_pages_in_file_order():
+    resources = [{'id': f'r-{i}', 'gender': 'female' if i % 3 else 'male'} for i in range(200)]
+    index = ColumnIndex(resources)
+    mask = index.filter({'gender': 'female'})
+    expected = [r for r in resources if r['gender'] == 'female']
+    assert index.count(mask) == len(expected)
+    assert index.select(mask, offset=70, limit=5) == expected[70:75]
+    assert index.select(mask, offset=500, limit=5) == []
+    assert index.select(mask, limit=0) == []
+
+
+def test_fhir_patient_search_offset_paging(client):
+    resp = client.get('/fhir/Patient?gender=female&_count=1&_offset=1')
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['total'] == 2
+    assert [e['resource']['id'] for e in data['entry']] == ['patient-3']
+
+
+def test_preload_store_waits_for_running_warmup(files_dir, monkeypatch):
+    tmp_dir = str(files_dir())
+    real_load = app_module.load_json_files
+
+    def slow_load(folder, progress=None):
+        time.sleep(0.2)
+        return real_load(folder, progress=progress)
+
+    monkeypatch.setattr(app_module, 'load_json_files', slow_load)
+    start_warmup(tmp_dir)
+    try:
+        # a second caller must not get back before the running warm-up has finished
+        preload_store(tmp_dir)
+        ready, types = store.status(tmp_dir)
+        assert ready
+        assert types['Patient']['status'] == 'ready'
+    finally:
+        gc.unfreeze()
+
+
+def test_reload_store_serves_new_files(client, files_dir):
+    tmp_path = files_dir()
+    try:
+        preload_store(str(tmp_path))
+        assert client.get('/fhir/Patient?_count=0').get_json()['total'] == 3
+
+        with open(tmp_path / 'Patient' / 'patient4.json', 'w', encoding='utf-8') as fh:
+            json.dump({'resourceType': 'Patient', 'id': 'patient-4', 'gender': 'other'}, fh)
+        # files are read once: the new one is only served after a reload
+        assert client.get('/fhir/Patient?_count=0').get_json()['total'] == 3
+        reload_store(str(tmp_path))
+        resp = client.get('/fhir/Patient?gender=other&_count=10')
+        assert resp.get_json()['total'] == 1
+        assert resp.get_json()['entry'][0]['resource']['id'] == 'patient-4'
+        assert client.get('/readyz').status_code == 200
+    finally:
+        gc.unfreeze()
+
+
+def test_column_index_many_distinct_names_and_birthdates():
+    rng = random.Random(3)
+    resources = [
+        {
+            'id': f'r-{i}',
+            'birthDate': f'{rng.randint(1900, 2020)}-{rng.randint(1, 12):02d}-01',
+            'name': [{'given': [''.join(rng.choice('abn') for _ in range(4))], 'family': 'Doe'}],
+        }
+        for i in range(2000)
+    ]
+    index = ColumnIndex(resources)
+    # scattered name matches use the row-by-row code path, prefixes a code range
+    for query in [{'name': 'an'}, {'name': 'bab'}, {'birthdate': '19'}, {'birthdate': '2001-0'},
+                  {'birthdate': '19', 'name': 'nn'}]:
+        expected = [r for r in resources if matches_search_params(r, query)]
+        mask = index.filter(query)
+        assert index.count(mask) == len(expected), query
+        assert index.select(mask) == expected, query
+
+
+def test_column_index_mask_cache_is_thread_safe(monkeypatch):
+    monkeypatch.setattr(app_module, 'MASK_CACHE_SIZE', 4)
+    resources = [{'id': f'r-{i}', 'birthDate': f'{1900 + i % 100}-01-01'} for i in range(2000)]
+    index = app_module.ColumnIndex(resources)
+    errors = []
+
+    def search(offset):
+        try:
+            for year in range(1900 + offset, 2000, 8):
+                assert index.count(index.filter({'birthdate': str(year)})) == 20
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=search, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 100 distinct prefixes through a 4-entry cache: every lookup evicts
+    assert errors == []